@@ -1,5 +1,5 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Request, Response, status
+from fastapi.responses import ORJSONResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 import os
@@ -8,12 +8,21 @@ from pathlib import Path
 from pydantic import BaseModel, Field
 from typing import List, Optional
 import sqlite3
+import re
 from datetime import datetime, timedelta
 import jwt
 import bcrypt
 import uuid
-import json
 import pymongo
+import hashlib
+import hmac
+import base64
+import calendar
+import time
+import orjson
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from cachetools import TTLCache
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -21,8 +30,17 @@ load_dotenv(ROOT_DIR / '.env')
 class InMemoryDB:
     def __init__(self):
         self.users = {}
+        self.users_by_username = {}
+        self.patient_ids = set()
+        self.patient_role_ids = set()
         self.forms = {}
+        self.forms_by_creator = {}
+        self.forms_by_patient = {}
+        self.latest_form_by_title = {}
         self.responses = {}
+        self.responses_by_form = {}
+        self.responses_by_patient = {}
+        self.responded_forms_by_patient = {}
 
 db = InMemoryDB()
 
@@ -31,128 +49,355 @@ USERS_FILE = DATA_DIR / 'users.json'
 FORMS_FILE = DATA_DIR / 'forms.json'
 RESPONSES_FILE = DATA_DIR / 'responses.json'
 
+SNAPSHOT_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+def snapshot_default(obj):
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError
+
+def dump_snapshot(data: dict) -> bytes:
+    # orjson writes datetimes as ISO-8601, matching what load_* parses
+    return orjson.dumps(data, default=snapshot_default, option=SNAPSHOT_OPTIONS)
+
+def snapshot_tmp_path(path: Path) -> Path:
+    return path.with_name(path.name + '.tmp')
+
+# Records changed since the last snapshot are appended to a sibling .log as
+# {"id": ..., "doc": ...} lines (a null doc is a delete) and replayed over the snapshot on load
+SNAPSHOT_PATHS = {"users": USERS_FILE, "forms": FORMS_FILE, "responses": RESPONSES_FILE}
+log_entries = {"users": 0, "forms": 0, "responses": 0}
+
+def log_path(path: Path) -> Path:
+    return path.with_name(path.name + '.log')
+
+def rotated_log_path(path: Path) -> Path:
+    return path.with_name(path.name + '.log.old')
+
+def append_log_bytes(path: Path, body: bytes):
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    with open(log_path(path), 'ab') as f:
+        start = f.tell()
+        try:
+            f.write(body)
+            f.flush()
+        except OSError:
+            # Drop a partial write so the retried batch starts on a fresh line
+            f.truncate(start)
+            raise
+
+def write_compacted(path: Path, body: bytes):
+    # The new snapshot already contains every logged change, so the log can go. It is set
+    # aside before the swap and dropped after it; if a crash leaves .log.old behind, a
+    # leftover .tmp means the swap never happened and read_store still needs those entries
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = snapshot_tmp_path(path)
+    tmp.write_bytes(body)
+    if log_path(path).exists():
+        os.replace(log_path(path), rotated_log_path(path))
+    os.replace(tmp, path)
+    rotated_log_path(path).unlink(missing_ok=True)
+
+def replay_log(data: dict, raw: bytes) -> int:
+    entries = 0
+    for line in raw.splitlines():
+        try:
+            entry = orjson.loads(line)
+        except orjson.JSONDecodeError:
+            continue
+        if entry["doc"] is None:
+            data.pop(entry["id"], None)
+        else:
+            data[entry["id"]] = entry["doc"]
+        entries += 1
+    return entries
+
+def read_store(name: str) -> dict:
+    path = SNAPSHOT_PATHS[name]
+    data = orjson.loads(path.read_bytes()) if path.exists() else {}
+    rotated = rotated_log_path(path)
+    if rotated.exists():
+        if snapshot_tmp_path(path).exists():
+            # Crashed mid-compaction before the swap: the rotated entries are still needed.
+            # Fold everything into a fresh snapshot now so the files are back to one log
+            replay_log(data, rotated.read_bytes())
+            if log_path(path).exists():
+                replay_log(data, log_path(path).read_bytes())
+            write_compacted(path, dump_snapshot(data))
+            log_entries[name] = 0
+            return data
+        # The swap finished, so the snapshot is newer than every rotated entry
+        rotated.unlink()
+    entries = 0
+    if log_path(path).exists():
+        raw = log_path(path).read_bytes()
+        complete = raw.rfind(b"\n") + 1
+        if complete < len(raw):
+            # A torn last line from a crash mid-append; cut it off so the next append starts on a fresh line
+            with open(log_path(path), 'r+b') as f:
+                f.truncate(complete)
+        entries = replay_log(data, raw[:complete])
+    log_entries[name] = entries
+    return data
+
+_DT_RE = re.compile(r"(\d{4})-(\d\d)-(\d\d)T(\d\d):(\d\d):(\d\d)(?:\.(\d{1,6}))?(?:\+00:00)?")
+
+def parse_datetime(value: str) -> datetime:
+    # Fast path for the ISO timestamps this app writes itself (naive, or UTC as stored in sqlite)
+    m = _DT_RE.fullmatch(value)
+    try:
+        if m:
+            return datetime(
+                int(m[1]), int(m[2]), int(m[3]), int(m[4]), int(m[5]), int(m[6]),
+                int(m[7].ljust(6, "0")) if m[7] else 0,
+            )
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return datetime.utcnow()
+
+_PATIENT_ROLES = frozenset(("patient", "patiente"))
+
+def is_patient_role(role: str) -> bool:
+    # Stored roles are almost always one of the two exact strings; only lower() anything else
+    if role == "patient":
+        return True
+    if role == "psychologist":
+        return False
+    return isinstance(role, str) and role.lower() in _PATIENT_ROLES
+
 def load_users():
     try:
-        if USERS_FILE.exists():
-            with open(USERS_FILE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                parsed = {}
-                for k, v in data.items():
-                    created = v.get("createdAt")
-                    if isinstance(created, str):
-                        try:
-                            v["createdAt"] = datetime.fromisoformat(created)
-                        except Exception:
-                            v["createdAt"] = datetime.utcnow()
-                    parsed[k] = v
-                db.users = parsed
+        data = read_store("users")
+        parsed = {}
+        for k, v in data.items():
+            # The store key is the canonical string id; legacy records may lack `_id` or hold another type
+            v["_id"] = k
+            created = v.get("createdAt")
+            if isinstance(created, str):
+                v["createdAt"] = parse_datetime(created)
+            # Resolved once here for patient listing and assignment; access checks go by role
+            # (like require_patient), resolved below into db.patient_role_ids
+            v["isPatient"] = is_patient_role(v.get("role")) or bool(v.get("isPatient"))
+            parsed[k] = v
+        db.users = parsed
+        db.users_by_username = {v["username"]: k for k, v in parsed.items()}
+        db.patient_ids = {k for k, v in parsed.items() if v["isPatient"]}
+        db.patient_role_ids = {k for k, v in parsed.items() if is_patient_role(v.get("role"))}
     except Exception:
         pass
 
 def save_users():
     try:
-        DATA_DIR.mkdir(parents=True, exist_ok=True)
-        to_save = {}
-        for k, v in db.users.items():
-            u = dict(v)
-            created = u.get("createdAt")
-            if isinstance(created, datetime):
-                u["createdAt"] = created.isoformat()
-            to_save[k] = u
-        with open(USERS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(to_save, f)
+        write_compacted(USERS_FILE, dump_snapshot(db.users))
+        log_entries["users"] = 0
     except Exception:
         pass
 
-load_users()
+def index_form_title(form_id: str, form: dict):
+    title_key = (form.get("createdBy"), form.get("title"))
+    latest = db.forms.get(db.latest_form_by_title.get(title_key))
+    if latest is None or latest["createdAt"] <= form["createdAt"]:
+        db.latest_form_by_title[title_key] = form_id
+
+def unindex_form_title(form_id: str, form: dict):
+    title_key = (form.get("createdBy"), form.get("title"))
+    if db.latest_form_by_title.get(title_key) != form_id:
+        return
+    del db.latest_form_by_title[title_key]
+    # Fall back to the creator's next newest form with that title, as a full scan would find it
+    for fid in db.forms_by_creator.get(form.get("createdBy"), ()):
+        other = db.forms.get(fid)
+        if fid != form_id and other is not None and other.get("title") == form.get("title"):
+            index_form_title(fid, other)
+
+def index_form(form_id: str, form: dict):
+    db.forms_by_creator.setdefault(form.get("createdBy"), set()).add(form_id)
+    for pid in form["assignedPatients"]:
+        db.forms_by_patient.setdefault(pid, set()).add(form_id)
+    index_form_title(form_id, form)
+
+def unindex_form(form_id: str, form: dict):
+    db.forms_by_creator.get(form.get("createdBy"), set()).discard(form_id)
+    for pid in form["assignedPatients"]:
+        db.forms_by_patient.get(pid, set()).discard(form_id)
+    unindex_form_title(form_id, form)
 
 def load_forms():
     try:
-        if FORMS_FILE.exists():
-            with open(FORMS_FILE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                parsed = {}
-                for k, v in data.items():
-                    ca = v.get("createdAt")
-                    ua = v.get("updatedAt")
-                    if isinstance(ca, str):
-                        try:
-                            v["createdAt"] = datetime.fromisoformat(ca)
-                        except Exception:
-                            v["createdAt"] = datetime.utcnow()
-                    if isinstance(ua, str):
-                        try:
-                            v["updatedAt"] = datetime.fromisoformat(ua)
-                        except Exception:
-                            v["updatedAt"] = datetime.utcnow()
-                    parsed[k] = v
-                db.forms = parsed
+        data = read_store("forms")
+        parsed = {}
+        for k, v in data.items():
+            ca = v.get("createdAt")
+            ua = v.get("updatedAt")
+            if isinstance(ca, str):
+                v["createdAt"] = parse_datetime(ca)
+            if isinstance(ua, str):
+                v["updatedAt"] = parse_datetime(ua)
+            # Held as a set for O(1) access checks; snapshot_default writes it back out as a list
+            v["assignedPatients"] = set(v.get("assignedPatients") or ())
+            parsed[k] = v
+        db.forms = parsed
+        for form_id, form in parsed.items():
+            index_form(form_id, form)
     except Exception:
         pass
 
 def save_forms():
     try:
-        DATA_DIR.mkdir(parents=True, exist_ok=True)
-        out = {}
-        for k, v in db.forms.items():
-            f = dict(v)
-            ca = f.get("createdAt")
-            ua = f.get("updatedAt")
-            if isinstance(ca, datetime):
-                f["createdAt"] = ca.isoformat()
-            if isinstance(ua, datetime):
-                f["updatedAt"] = ua.isoformat()
-            out[k] = f
-        with open(FORMS_FILE, 'w', encoding='utf-8') as fw:
-            json.dump(out, fw)
+        mark = sqlite_tombstone_mark()
+        write_compacted(FORMS_FILE, dump_snapshot(db.forms))
+        log_entries["forms"] = 0
+        if mark:
+            sqlite_clear_tombstones(mark)
     except Exception:
         pass
 
+def index_response(response_id: str, response: dict):
+    db.responses_by_form.setdefault(response.get("formId"), set()).add(response_id)
+    db.responses_by_patient.setdefault(response.get("patientId"), set()).add(response_id)
+    db.responded_forms_by_patient.setdefault(response.get("patientId"), set()).add(response.get("formId"))
+
+def drop_form(form_id: str, form: dict):
+    # Removes a form and its responses from memory and queues the deletes for the snapshots
+    db.forms.pop(form_id, None)
+    unindex_form(form_id, form)
+    mark_dirty("forms", form_id)
+    for rid in db.responses_by_form.pop(form_id, ()):
+        r = db.responses.pop(rid, None)
+        if r is not None:
+            db.responses_by_patient.get(r.get("patientId"), set()).discard(rid)
+            db.responded_forms_by_patient.get(r.get("patientId"), set()).discard(form_id)
+            mark_dirty("responses", rid)
+
 def load_responses():
     try:
-        if RESPONSES_FILE.exists():
-            with open(RESPONSES_FILE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                parsed = {}
-                for k, v in data.items():
-                    sa = v.get("submittedAt")
-                    if isinstance(sa, str):
-                        try:
-                            v["submittedAt"] = datetime.fromisoformat(sa)
-                        except Exception:
-                            v["submittedAt"] = datetime.utcnow()
-                    parsed[k] = v
-                db.responses = parsed
+        data = read_store("responses")
+        parsed = {}
+        for k, v in data.items():
+            sa = v.get("submittedAt")
+            if isinstance(sa, str):
+                v["submittedAt"] = parse_datetime(sa)
+            parsed[k] = v
+        db.responses = parsed
+        db.responses_by_form = {}
+        db.responses_by_patient = {}
+        db.responded_forms_by_patient = {}
+        for k, v in parsed.items():
+            index_response(k, v)
     except Exception:
         pass
 
 def save_responses():
     try:
-        DATA_DIR.mkdir(parents=True, exist_ok=True)
-        out = {}
-        for k, v in db.responses.items():
-            r = dict(v)
-            sa = r.get("submittedAt")
-            if isinstance(sa, datetime):
-                r["submittedAt"] = sa.isoformat()
-            out[k] = r
-        with open(RESPONSES_FILE, 'w', encoding='utf-8') as fw:
-            json.dump(out, fw)
+        write_compacted(RESPONSES_FILE, dump_snapshot(db.responses))
+        log_entries["responses"] = 0
     except Exception:
         pass
 
-load_forms()
-load_responses()
+# Changes are persisted by a background task; handlers only mark the touched record ids
+SAVE_INTERVAL_SECONDS = 0.5
+# Once a log holds this many entries, the next flush rewrites the snapshot instead
+COMPACT_AFTER = 1000
+_pending = {"users": set(), "forms": set(), "responses": set()}
+_savers = {"users": save_users, "forms": save_forms, "responses": save_responses}
+flush_task = None
+# Single writer thread, so snapshot writes never overlap and shutdown can wait for them
+snapshot_executor = None
+
+def mark_dirty(name: str, record_id: str):
+    _pending[name].add(record_id)
+
+def flush_dirty():
+    # Fold everything into the snapshots, e.g. on shutdown
+    for name in _pending:
+        if _pending[name] or log_entries[name]:
+            _pending[name] = set()
+            _savers[name]()
+
+async def flush_loop():
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(SAVE_INTERVAL_SECONDS)
+        for name, ids in _pending.items():
+            if not ids:
+                continue
+            _pending[name] = set()
+            store = getattr(db, name)
+            path = SNAPSHOT_PATHS[name]
+            # Tombstones up to here are for deletes already in `ids` (or in an earlier write)
+            mark = sqlite_tombstone_mark() if name == "forms" else None
+            # Serialize on the loop so the records are consistent; only the disk write is offloaded
+            try:
+                if log_entries[name] + len(ids) > COMPACT_AFTER:
+                    body = dump_snapshot(store)
+                    await loop.run_in_executor(snapshot_executor, write_compacted, path, body)
+                    log_entries[name] = 0
+                else:
+                    body = b"".join(dump_snapshot({"id": rid, "doc": store.get(rid)}) + b"\n" for rid in ids)
+                    await loop.run_in_executor(snapshot_executor, append_log_bytes, path, body)
+                    log_entries[name] += len(ids)
+                if mark:
+                    sqlite_clear_tombstones(mark)
+            except Exception:
+                # Requeue so the records are written on a later tick instead of waiting for shutdown
+                _pending[name] |= ids
+                logger.exception("Failed to persist %s changes", name)
 
 # Security
 SECRET_KEY = os.environ.get('SECRET_KEY', 'your-secret-key-change-in-production')
 ALGORITHM = "HS256"
-security = HTTPBearer()
+_KEY = SECRET_KEY.encode('utf-8')
+# Reused decoder: exp is still verified, but options are resolved once
+_jwt = jwt.PyJWT(options={"require": ["exp"]})
+_JWT_DECODE_KWARGS = {"key": _KEY, "algorithms": [ALGORITHM]}
+# HS256 signing state that is identical for every token we issue
+_JWT_HEADER_B64 = base64.urlsafe_b64encode(orjson.dumps({"alg": ALGORITHM, "typ": "JWT"})).rstrip(b"=")
+_HMAC_PROTO = hmac.new(_KEY, digestmod=hashlib.sha256)
+
+BCRYPT_COST = int(os.environ.get("BCRYPT_COST", "12"))
+bcrypt_executor = None
+dummy_password_hash = None
+
+# Validated token payloads keyed by the raw token; exp is still checked on every hit
+_auth_cache = TTLCache(maxsize=10000, ttl=300)
+# Rejected tokens -> 401 detail, so replayed bad tokens skip verification too
+_rejected_tokens = TTLCache(maxsize=10000, ttl=30)
+
+# Short-lived rendered bodies for polled endpoints; patients_version is bumped on patient signup
+_response_cache = TTLCache(maxsize=10000, ttl=10)
+patients_version = 0
+
+ORJSON_OPTIONS = orjson.OPT_NAIVE_UTC | orjson.OPT_OMIT_MICROSECONDS
+
+class UTCORJSONResponse(ORJSONResponse):
+    # Naive datetimes are stored as UTC; let orjson emit them directly
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=ORJSON_OPTIONS)
+
+def cached_json_response(key, build) -> Response:
+    body = _response_cache.get(key)
+    if body is None:
+        body = orjson.dumps(build(), option=ORJSON_OPTIONS)
+        _response_cache[key] = body
+    return Response(content=body, media_type="application/json")
 
 # Create the main app
-app = FastAPI()
+app = FastAPI(default_response_class=UTCORJSONResponse)
 api_router = APIRouter(prefix="/api")
 
+# Comma-separated allowed origins; auth is bearer-only so no credentialed CORS
+CORS_ORIGINS = [o.strip() for o in os.environ.get("CORS_ORIGINS", "*").split(",") if o.strip()]
+CORS_ORIGIN_REGEX = os.environ.get("CORS_ORIGIN_REGEX") or None
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_credentials=False,
+    allow_origins=CORS_ORIGINS,
+    allow_origin_regex=CORS_ORIGIN_REGEX,
+    allow_methods=["GET", "POST", "PUT", "DELETE"],
+    allow_headers=["Authorization", "Content-Type"],
+)
+
 MONGODB_URI = os.environ.get("MONGODB_URI") or os.environ.get("MONGO_URI")
 MONGO_DB_NAME = os.environ.get("MONGO_DB", "bemestar")
 mongo_client = None
@@ -162,7 +407,15 @@ def init_mongo_architecture():
     global mongo_client, mongo_db
     if not MONGODB_URI:
         return
-    mongo_client = pymongo.MongoClient(MONGODB_URI)
+    mongo_client = pymongo.MongoClient(
+        MONGODB_URI,
+        maxPoolSize=200,
+        minPoolSize=10,
+        compressors="zstd,zlib",
+        retryWrites=True,
+        serverSelectionTimeoutMS=2000,
+        waitQueueTimeoutMS=1000,
+    )
     mongo_db = mongo_client.get_database(MONGO_DB_NAME)
     mongo_db.users.create_index("username", unique=True)
     mongo_db.users.create_index("email", unique=False)
@@ -174,14 +427,26 @@ def init_mongo_architecture():
     mongo_db.responses.create_index([("formId", pymongo.ASCENDING), ("patientId", pymongo.ASCENDING)], unique=True)
 
 SQLITE_FILE = str((DATA_DIR / 'bemestar.db').resolve())
+# Opened once at startup and shared by every request. All handlers are async and touch it
+# only from the event loop thread, so calls are already serialized without a lock
 sqlite_conn = None
 
 def init_sqlite():
     global sqlite_conn
     DATA_DIR.mkdir(parents=True, exist_ok=True)
-    sqlite_conn = sqlite3.connect(SQLITE_FILE)
+    # Writes open with BEGIN IMMEDIATE so a transaction takes the write lock up front
+    # instead of failing with SQLITE_BUSY when it upgrades mid-way
+    sqlite_conn = sqlite3.connect(SQLITE_FILE, check_same_thread=False, cached_statements=512, isolation_level="IMMEDIATE")
+    # WAL lets readers proceed while a write is in flight; NORMAL sync is durable at checkpoints
+    sqlite_conn.execute("PRAGMA journal_mode = WAL;")
+    sqlite_conn.execute("PRAGMA synchronous = NORMAL;")
+    sqlite_conn.execute("PRAGMA cache_size = -65536;")
+    sqlite_conn.execute("PRAGMA busy_timeout = 3000;")
+    sqlite_conn.execute("PRAGMA temp_store = MEMORY;")
+    sqlite_conn.execute("PRAGMA mmap_size = 268435456;")
     sqlite_conn.execute("PRAGMA foreign_keys = ON;")
     create_sqlite_tables()
+    migrate_sqlite_timestamps()
 
 def create_sqlite_tables():
     c = sqlite_conn.cursor()
@@ -239,171 +504,343 @@ def create_sqlite_tables():
         answerText TEXT
     );
     """)
+    # Tombstones for deleted forms, so a delete that reached sqlite but not the JSON log
+    # is not seeded back in by migrate_json_to_sqlite
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS deleted_forms (
+        id TEXT PRIMARY KEY
+    );
+    """)
     c.execute("CREATE INDEX IF NOT EXISTS idx_forms_createdBy ON forms(createdBy);")
     c.execute("CREATE UNIQUE INDEX IF NOT EXISTS uq_responses_form_patient ON responses(formId, patientId);")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_responses_patientId ON responses(patientId);")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_response_answers_responseId ON response_answers(responseId);")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_questions_formId ON questions(formId);")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_fap_patientId ON form_assigned_patients(patientId);")
     sqlite_conn.commit()
 
+def sqlite_timestamp(value) -> str:
+    # Stored exactly as UTCORJSONResponse renders it, so reads pass the text through without parsing
+    if isinstance(value, str):
+        value = parse_datetime(value)
+    if not isinstance(value, datetime):
+        return None
+    return orjson.dumps(value, option=ORJSON_OPTIONS)[1:-1].decode('ascii')
+
+# Bumped via PRAGMA user_version once the timestamp rewrite below has run
+SQLITE_SCHEMA_VERSION = 1
+
+def migrate_sqlite_timestamps():
+    # Rows from before timestamps matched the API format (naive, with microseconds) are rewritten once
+    if sqlite_conn.execute("PRAGMA user_version").fetchone()[0] >= SQLITE_SCHEMA_VERSION:
+        return
+    with sqlite_conn:
+        sqlite_conn.executemany("UPDATE users SET createdAt = ? WHERE id = ?", [
+            (sqlite_timestamp(r[1]), r[0]) for r in sqlite_conn.execute("SELECT id, createdAt FROM users")
+        ])
+        sqlite_conn.executemany("UPDATE forms SET createdAt = ?, updatedAt = ? WHERE id = ?", [
+            (sqlite_timestamp(r[1]), sqlite_timestamp(r[2]), r[0])
+            for r in sqlite_conn.execute("SELECT id, createdAt, updatedAt FROM forms")
+        ])
+        sqlite_conn.executemany("UPDATE responses SET submittedAt = ? WHERE id = ?", [
+            (sqlite_timestamp(r[1]), r[0]) for r in sqlite_conn.execute("SELECT id, submittedAt FROM responses")
+        ])
+        sqlite_conn.execute(f"PRAGMA user_version = {SQLITE_SCHEMA_VERSION}")
+
+INSERT_USER_SQL = "INSERT OR REPLACE INTO users(id, username, password, name, email, role, isPatient, createdAt) VALUES(?,?,?,?,?,?,?,?)"
+INSERT_FORM_SQL = "INSERT OR REPLACE INTO forms(id, title, description, createdBy, createdAt, updatedAt) VALUES(?,?,?,?,?,?)"
+INSERT_QUESTION_SQL = "INSERT OR REPLACE INTO questions(id, formId, text, ord) VALUES(?,?,?,?)"
+INSERT_ASSIGNMENT_SQL = "INSERT OR IGNORE INTO form_assigned_patients(formId, patientId) VALUES(?,?)"
+INSERT_RESPONSE_SQL = "INSERT OR REPLACE INTO responses(id, formId, patientId, submittedAt) VALUES(?,?,?,?)"
+INSERT_ANSWER_SQL = "INSERT OR REPLACE INTO response_answers(id, responseId, questionId, questionText, answerText) VALUES(?,?,?,?,?)"
+UPDATE_FORM_SQL = "UPDATE forms SET title = ?, description = ?, updatedAt = ? WHERE id = ?"
+
+# Hot read statements; keeping the text identical on every call lets the connection's statement cache reuse them
+FORM_RESPONSES_SQL = (
+    "SELECT r.id, u.name, u.email, r.submittedAt FROM responses r "
+    "LEFT JOIN users u ON u.id = r.patientId WHERE r.formId = ?"
+)
+FORM_RESPONSE_ANSWERS_SQL = (
+    "SELECT responseId, questionId, questionText, answerText FROM response_answers "
+    "WHERE responseId IN (SELECT id FROM responses WHERE formId = ?) ORDER BY rowid"
+)
+PATIENT_RESPONSES_SQL = (
+    "SELECT r.id, f.title, r.submittedAt FROM responses r "
+    "LEFT JOIN forms f ON f.id = r.formId WHERE r.patientId = ?"
+)
+PATIENT_RESPONSE_ANSWERS_SQL = (
+    "SELECT responseId, questionText, answerText FROM response_answers "
+    "WHERE responseId IN (SELECT id FROM responses WHERE patientId = ?) ORDER BY rowid"
+)
+PATIENT_AVAILABLE_FORMS_SQL = """
+    SELECT f.id, f.title, f.description, u.name, f.createdAt,
+        (SELECT COUNT(1) FROM questions q WHERE q.formId = f.id)
+    FROM forms f
+    JOIN form_assigned_patients ap ON ap.formId = f.id
+    LEFT JOIN users u ON u.id = f.createdBy
+    WHERE ap.patientId = ?
+        AND NOT EXISTS (SELECT 1 FROM responses r WHERE r.formId = f.id AND r.patientId = ?)
+"""
+
+def user_row(user: dict) -> tuple:
+    return (
+        str(user.get("_id")),
+        user.get("username"),
+        user.get("password"),
+        user.get("name"),
+        user.get("email"),
+        user.get("role"),
+        1 if user.get("isPatient") else 0,
+        sqlite_timestamp(user.get("createdAt"))
+    )
+
+def form_row(form: dict) -> tuple:
+    return (
+        str(form.get("_id")),
+        form.get("title"),
+        form.get("description"),
+        str(form.get("createdBy")),
+        sqlite_timestamp(form.get("createdAt")),
+        sqlite_timestamp(form.get("updatedAt"))
+    )
+
+def question_rows(form_id: str, questions) -> list:
+    return [(q.get("id"), form_id, q.get("text"), q.get("order")) for q in questions or []]
+
+def assignment_rows(form_id: str, patient_ids) -> list:
+    return [(form_id, str(pid)) for pid in patient_ids or []]
+
+def response_row(resp: dict) -> tuple:
+    return (
+        str(resp.get("_id")),
+        str(resp.get("formId")),
+        str(resp.get("patientId")),
+        sqlite_timestamp(resp.get("submittedAt"))
+    )
+
+def answer_rows(response_id: str, answers) -> list:
+    return [
+        (uuid.uuid4().hex, response_id, a.get("questionId"), a.get("questionText"), a.get("answerText"))
+        for a in answers or []
+    ]
+
+def recover_from_sqlite():
+    # sqlite commits on every write but the JSON log only catches up on the next flush, so after a
+    # crash sqlite can be ahead: replay its deletes and load its extra records into memory, marking
+    # them dirty so the snapshots pick them up
+    try:
+        if not sqlite_conn:
+            return
+        for (form_id,) in sqlite_conn.execute("SELECT id FROM deleted_forms"):
+            form = db.forms.get(form_id)
+            if form is not None:
+                drop_form(form_id, form)
+        for row in sqlite_conn.execute(
+            "SELECT id, username, password, name, email, role, isPatient, createdAt FROM users"
+        ).fetchall():
+            if row[0] in db.users or row[1] in db.users_by_username:
+                continue
+            user = {
+                "username": row[1],
+                "password": row[2],
+                "name": row[3],
+                "email": row[4],
+                "role": row[5],
+                "isPatient": is_patient_role(row[5]) or bool(row[6]),
+                "createdAt": parse_datetime(row[7]) if row[7] else datetime.utcnow(),
+                "_id": row[0],
+            }
+            db.users[row[0]] = user
+            db.users_by_username[row[1]] = row[0]
+            if user["isPatient"]:
+                db.patient_ids.add(row[0])
+            if is_patient_role(row[5]):
+                db.patient_role_ids.add(row[0])
+            mark_dirty("users", row[0])
+        for (form_id,) in sqlite_conn.execute("SELECT id FROM forms").fetchall():
+            if form_id in db.forms:
+                continue
+            form = sqlite_get_form_by_id(form_id)
+            if form is None:
+                continue
+            form["createdAt"] = parse_datetime(form["createdAt"])
+            form["updatedAt"] = parse_datetime(form["updatedAt"])
+            db.forms[form_id] = form
+            index_form(form_id, form)
+            mark_dirty("forms", form_id)
+        missing = [
+            r for r in sqlite_conn.execute("SELECT id, formId, patientId, submittedAt FROM responses").fetchall()
+            if r[0] not in db.responses
+        ]
+        for r in missing:
+            form = db.forms.get(r[1], {})
+            patient = db.users.get(r[2], {})
+            response = {
+                "formId": r[1],
+                "formTitle": form.get("title"),
+                "patientId": r[2],
+                "patientName": patient.get("name"),
+                "patientEmail": patient.get("email"),
+                "answers": [
+                    {"questionId": a[0], "questionText": a[1], "answerText": a[2]}
+                    for a in sqlite_conn.execute(
+                        "SELECT questionId, questionText, answerText FROM response_answers WHERE responseId = ? ORDER BY rowid",
+                        (r[0],)
+                    )
+                ],
+                "submittedAt": parse_datetime(r[3]) if r[3] else datetime.utcnow(),
+                "_id": r[0],
+            }
+            db.responses[r[0]] = response
+            index_response(r[0], response)
+            mark_dirty("responses", r[0])
+    except Exception:
+        logger.exception("Failed to recover unflushed records from sqlite")
+
+def sqlite_tombstone_mark():
+    # Highest tombstone rowid; every delete up to it is already in memory and queued for the JSON store
+    try:
+        return sqlite_conn.execute("SELECT MAX(rowid) FROM deleted_forms").fetchone()[0] if sqlite_conn else None
+    except Exception:
+        return None
+
+def sqlite_clear_tombstones(mark):
+    # Called once the forms store has been written past `mark`, so those deletes are durable in JSON too
+    try:
+        with sqlite_conn:
+            sqlite_conn.execute("DELETE FROM deleted_forms WHERE rowid <= ?", (mark,))
+    except Exception:
+        pass
+
 def migrate_json_to_sqlite():
+    # sqlite keeps the rows it already has; the JSON snapshots only seed what is missing,
+    # so a restart does not rewrite every table (or duplicate response answers)
     try:
-        for u in list(db.users.values()):
-            sqlite_insert_user(u)
-        for f in list(db.forms.values()):
-            sqlite_insert_form(f)
-        for r in list(db.responses.values()):
-            sqlite_insert_response(r)
+        if not sqlite_conn:
+            return
+        known_users = {r[0] for r in sqlite_conn.execute("SELECT id FROM users")}
+        known_forms = {r[0] for r in sqlite_conn.execute("SELECT id FROM forms")}
+        known_responses = {r[0] for r in sqlite_conn.execute("SELECT id FROM responses")}
+        users = [u for k, u in db.users.items() if k not in known_users]
+        forms = [f for k, f in db.forms.items() if k not in known_forms]
+        responses = [r for k, r in db.responses.items() if k not in known_responses]
+        if not (users or forms or responses):
+            return
+        try:
+            with sqlite_conn:
+                sqlite_conn.executemany(INSERT_USER_SQL, [user_row(u) for u in users])
+                sqlite_conn.executemany(INSERT_FORM_SQL, [form_row(f) for f in forms])
+                sqlite_conn.executemany(INSERT_QUESTION_SQL, [
+                    row for f in forms for row in question_rows(str(f.get("_id")), f.get("questions"))
+                ])
+                sqlite_conn.executemany(INSERT_ASSIGNMENT_SQL, [
+                    row for f in forms for row in assignment_rows(str(f.get("_id")), f.get("assignedPatients"))
+                ])
+                sqlite_conn.executemany(INSERT_RESPONSE_SQL, [response_row(r) for r in responses])
+                sqlite_conn.executemany(INSERT_ANSWER_SQL, [
+                    row for r in responses for row in answer_rows(str(r.get("_id")), r.get("answers"))
+                ])
+        except sqlite3.Error:
+            # One bad legacy row rolls back the whole batch; retry row by row so the rest still lands
+            for u in users:
+                sqlite_insert_user(u)
+            for f in forms:
+                sqlite_insert_form(f)
+            for r in responses:
+                sqlite_insert_response(r)
     except Exception:
         pass
 
 def sqlite_insert_user(user: dict):
     try:
-        sqlite_conn.execute(
-            "INSERT OR REPLACE INTO users(id, username, password, name, email, role, isPatient, createdAt) VALUES(?,?,?,?,?,?,?,?)",
-            (
-                str(user.get("_id")),
-                user.get("username"),
-                user.get("password"),
-                user.get("name"),
-                user.get("email"),
-                user.get("role"),
-                1 if user.get("isPatient") else 0,
-                (user.get("createdAt").isoformat() if isinstance(user.get("createdAt"), datetime) else str(user.get("createdAt")))
-            )
-        )
+        sqlite_conn.execute(INSERT_USER_SQL, user_row(user))
         sqlite_conn.commit()
     except Exception:
         pass
 
 def sqlite_insert_form(form: dict):
     try:
-        sqlite_conn.execute(
-            "INSERT OR REPLACE INTO forms(id, title, description, createdBy, createdAt, updatedAt) VALUES(?,?,?,?,?,?)",
-            (
-                str(form.get("_id")),
-                form.get("title"),
-                form.get("description"),
-                str(form.get("createdBy")),
-                (form.get("createdAt").isoformat() if isinstance(form.get("createdAt"), datetime) else str(form.get("createdAt"))),
-                (form.get("updatedAt").isoformat() if isinstance(form.get("updatedAt"), datetime) else str(form.get("updatedAt")))
-            )
-        )
-        for q in form.get("questions", []):
-            sqlite_conn.execute(
-                "INSERT OR REPLACE INTO questions(id, formId, text, ord) VALUES(?,?,?,?)",
-                (
-                    q.get("id"),
-                    str(form.get("_id")),
-                    q.get("text"),
-                    q.get("order")
-                )
-            )
-        for pid in form.get("assignedPatients", []):
-            sqlite_conn.execute(
-                "INSERT OR IGNORE INTO form_assigned_patients(formId, patientId) VALUES(?,?)",
-                (str(form.get("_id")), str(pid))
-            )
-        sqlite_conn.commit()
+        form_id = str(form.get("_id"))
+        with sqlite_conn:
+            sqlite_conn.execute(INSERT_FORM_SQL, form_row(form))
+            sqlite_conn.executemany(INSERT_QUESTION_SQL, question_rows(form_id, form.get("questions")))
+            sqlite_conn.executemany(INSERT_ASSIGNMENT_SQL, assignment_rows(form_id, form.get("assignedPatients")))
     except Exception:
         pass
 
 def sqlite_insert_response(resp: dict):
     try:
-        sqlite_conn.execute(
-            "INSERT OR REPLACE INTO responses(id, formId, patientId, submittedAt) VALUES(?,?,?,?)",
-            (
-                str(resp.get("_id")),
-                str(resp.get("formId")),
-                str(resp.get("patientId")),
-                (resp.get("submittedAt").isoformat() if isinstance(resp.get("submittedAt"), datetime) else str(resp.get("submittedAt")))
-            )
-        )
-        for a in resp.get("answers", []):
-            sqlite_conn.execute(
-                "INSERT OR REPLACE INTO response_answers(id, responseId, questionId, questionText, answerText) VALUES(?,?,?,?,?)",
-                (
-                    uuid.uuid4().hex,
-                    str(resp.get("_id")),
-                    a.get("questionId"),
-                    a.get("questionText"),
-                    a.get("answerText")
-                )
-            )
-        sqlite_conn.commit()
+        response_id = str(resp.get("_id"))
+        with sqlite_conn:
+            sqlite_conn.execute(INSERT_RESPONSE_SQL, response_row(resp))
+            sqlite_conn.executemany(INSERT_ANSWER_SQL, answer_rows(response_id, resp.get("answers")))
     except Exception:
         pass
 
 def sqlite_update_form(form_id: str, updated: dict):
+    # `updated` is the whole form document, so one fixed UPDATE covers every edit
     try:
-        fields = []
-        values = []
-        if "title" in updated:
-            fields.append("title = ?")
-            values.append(updated.get("title"))
-        if "description" in updated:
-            fields.append("description = ?")
-            values.append(updated.get("description"))
-        if "updatedAt" in updated:
-            val = updated.get("updatedAt")
-            val = (val.isoformat() if isinstance(val, datetime) else str(val))
-            fields.append("updatedAt = ?")
-            values.append(val)
-        if fields:
-            values.append(form_id)
-            sqlite_conn.execute(f"UPDATE forms SET {', '.join(fields)} WHERE id = ?", tuple(values))
-        if "questions" in updated:
-            sqlite_conn.execute("DELETE FROM questions WHERE formId = ?", (form_id,))
-            for q in (updated.get("questions") or []):
-                sqlite_conn.execute(
-                    "INSERT OR REPLACE INTO questions(id, formId, text, ord) VALUES(?,?,?,?)",
-                    (q.get("id"), form_id, q.get("text"), q.get("order"))
-                )
-        if "assignedPatients" in updated:
-            sqlite_conn.execute("DELETE FROM form_assigned_patients WHERE formId = ?", (form_id,))
-            for pid in (updated.get("assignedPatients") or []):
-                sqlite_conn.execute(
-                    "INSERT OR IGNORE INTO form_assigned_patients(formId, patientId) VALUES(?,?)",
-                    (form_id, str(pid))
-                )
-        sqlite_conn.commit()
+        with sqlite_conn:
+            sqlite_conn.execute(
+                UPDATE_FORM_SQL,
+                (updated.get("title"), updated.get("description"), sqlite_timestamp(updated.get("updatedAt")), form_id)
+            )
+            if "questions" in updated:
+                sqlite_conn.execute("DELETE FROM questions WHERE formId = ?", (form_id,))
+                sqlite_conn.executemany(INSERT_QUESTION_SQL, question_rows(form_id, updated.get("questions")))
+            if "assignedPatients" in updated:
+                sqlite_conn.execute("DELETE FROM form_assigned_patients WHERE formId = ?", (form_id,))
+                sqlite_conn.executemany(INSERT_ASSIGNMENT_SQL, assignment_rows(form_id, updated.get("assignedPatients")))
     except Exception:
         pass
 
 def sqlite_delete_form(form_id: str):
     try:
-        rows = sqlite_conn.execute("SELECT id FROM responses WHERE formId = ?", (form_id,)).fetchall()
-        for r in rows:
-            sqlite_conn.execute("DELETE FROM response_answers WHERE responseId = ?", (r[0],))
-        sqlite_conn.execute("DELETE FROM responses WHERE formId = ?", (form_id,))
-        sqlite_conn.execute("DELETE FROM questions WHERE formId = ?", (form_id,))
-        sqlite_conn.execute("DELETE FROM form_assigned_patients WHERE formId = ?", (form_id,))
-        sqlite_conn.execute("DELETE FROM forms WHERE id = ?", (form_id,))
-        sqlite_conn.commit()
+        with sqlite_conn:
+            sqlite_conn.execute(
+                "DELETE FROM response_answers WHERE responseId IN (SELECT id FROM responses WHERE formId = ?)",
+                (form_id,)
+            )
+            sqlite_conn.execute("DELETE FROM responses WHERE formId = ?", (form_id,))
+            sqlite_conn.execute("DELETE FROM questions WHERE formId = ?", (form_id,))
+            sqlite_conn.execute("DELETE FROM form_assigned_patients WHERE formId = ?", (form_id,))
+            sqlite_conn.execute("DELETE FROM forms WHERE id = ?", (form_id,))
+            sqlite_conn.execute("INSERT OR IGNORE INTO deleted_forms(id) VALUES(?)", (form_id,))
     except Exception:
         pass
 
 def sqlite_get_forms_for_psychologist(psych_id: str):
+    # Returns the serialized list body, so get_forms can send it without building dicts
     try:
         if not sqlite_conn:
             return None
-        c = sqlite_conn.cursor()
-        rows = c.execute(
-            "SELECT id, title, description, createdAt, updatedAt FROM forms WHERE createdBy = ?",
-            (psych_id,)
-        ).fetchall()
-        result = []
-        for r in rows:
-            fid = r[0]
-            rc = c.execute("SELECT COUNT(1) FROM responses WHERE formId = ?", (fid,)).fetchone()[0]
-            qc = c.execute("SELECT COUNT(1) FROM questions WHERE formId = ?", (fid,)).fetchone()[0]
-            result.append({
-                "id": str(fid),
-                "title": r[1],
-                "description": r[2] or "",
-                "questionCount": qc or 0,
-                "responseCount": rc or 0,
-                "createdAt": r[3],
-                "updatedAt": r[4],
-            })
-        return result
+        row = sqlite_conn.execute(
+            """
+            SELECT json_group_array(json_object(
+                'id', f.id,
+                'title', f.title,
+                'description', COALESCE(f.description, ''),
+                'questionCount', COALESCE(qc.c, 0),
+                'responseCount', COALESCE(rc.c, 0),
+                'createdAt', f.createdAt,
+                'updatedAt', f.updatedAt
+            ))
+            FROM forms f
+            LEFT JOIN (
+                SELECT formId, COUNT(1) AS c FROM questions
+                WHERE formId IN (SELECT id FROM forms WHERE createdBy = ?)
+                GROUP BY formId
+            ) qc ON qc.formId = f.id
+            LEFT JOIN (
+                SELECT formId, COUNT(1) AS c FROM responses
+                WHERE formId IN (SELECT id FROM forms WHERE createdBy = ?)
+                GROUP BY formId
+            ) rc ON rc.formId = f.id
+            WHERE f.createdBy = ?
+            """,
+            (psych_id, psych_id, psych_id)
+        ).fetchone()
+        return row[0].encode('utf-8')
     except Exception:
         return None
 
@@ -411,63 +848,63 @@ def sqlite_get_form_by_id(form_id: str):
     try:
         if not sqlite_conn:
             return None
-        c = sqlite_conn.cursor()
-        f = c.execute(
-            "SELECT id, title, description, createdBy, createdAt, updatedAt FROM forms WHERE id = ?",
+        # One statement builds the whole document; questions and assignments come back as JSON arrays
+        row = sqlite_conn.execute(
+            """
+            SELECT json_object(
+                '_id', f.id,
+                'title', f.title,
+                'description', COALESCE(f.description, ''),
+                'createdBy', f.createdBy,
+                'createdAt', f.createdAt,
+                'updatedAt', f.updatedAt,
+                'questions', (
+                    SELECT json_group_array(json_object('id', q.id, 'text', q.text, 'order', COALESCE(q.ord, 0)))
+                    FROM (SELECT id, text, ord FROM questions WHERE formId = f.id ORDER BY ord ASC) q
+                ),
+                'assignedPatients', (
+                    SELECT json_group_array(ap.patientId) FROM form_assigned_patients ap WHERE ap.formId = f.id
+                )
+            )
+            FROM forms f WHERE f.id = ?
+            """,
             (form_id,)
         ).fetchone()
-        if not f:
+        if not row:
             return None
-        qs = c.execute(
-            "SELECT id, text, ord FROM questions WHERE formId = ? ORDER BY ord ASC",
-            (form_id,)
-        ).fetchall()
-        aps = c.execute(
-            "SELECT patientId FROM form_assigned_patients WHERE formId = ?",
-            (form_id,)
-        ).fetchall()
-        return {
-            "_id": f[0],
-            "title": f[1],
-            "description": f[2] or "",
-            "createdBy": f[3],
-            "createdAt": f[4],
-            "updatedAt": f[5],
-            "questions": [{"id": q[0], "text": q[1], "order": int(q[2] or 0)} for q in qs],
-            "assignedPatients": [str(a[0]) for a in aps],
-        }
+        form = orjson.loads(row[0])
+        form["assignedPatients"] = set(form["assignedPatients"])
+        return form
     except Exception:
         return None
 
+# Read-mostly form documents; entries are dropped on update/delete
+_form_cache = TTLCache(maxsize=1000, ttl=30)
+
+def load_form(form_id: str):
+    form = _form_cache.get(form_id)
+    if form is None:
+        form = sqlite_get_form_by_id(form_id)
+        if form is not None:
+            _form_cache[form_id] = form
+    return form
+
 def sqlite_get_patient_available_forms(patient_id: str):
     try:
         if not sqlite_conn:
             return None
-        c = sqlite_conn.cursor()
-        responded = [row[0] for row in c.execute(
-            "SELECT formId FROM responses WHERE patientId = ?",
-            (patient_id,)
-        ).fetchall()]
-        ph = c.execute(
-            "SELECT f.id, f.title, f.description, f.createdBy, f.createdAt FROM forms f JOIN form_assigned_patients ap ON ap.formId = f.id WHERE ap.patientId = ?",
-            (patient_id,)
-        ).fetchall()
-        result = []
-        for r in ph:
-            fid = r[0]
-            if str(fid) in set(str(x) for x in responded):
-                continue
-            qc = c.execute("SELECT COUNT(1) FROM questions WHERE formId = ?", (fid,)).fetchone()[0]
-            p = c.execute("SELECT name FROM users WHERE id = ?", (r[3],)).fetchone()
-            result.append({
-                "id": str(fid),
+        rows = sqlite_conn.execute(PATIENT_AVAILABLE_FORMS_SQL, (patient_id, patient_id))
+        return [
+            {
+                "id": r[0],
                 "title": r[1],
                 "description": r[2] or "",
-                "questionCount": qc or 0,
-                "psychologistName": (p[0] if p else "Unknown"),
+                "questionCount": r[5] or 0,
+                "psychologistName": r[3] or "Unknown",
                 "createdAt": r[4],
-            })
-        return result
+            }
+            for r in rows
+        ]
     except Exception:
         return None
 
@@ -476,26 +913,20 @@ def sqlite_get_form_responses(form_id: str):
         if not sqlite_conn:
             return None
         c = sqlite_conn.cursor()
-        rows = c.execute(
-            "SELECT id, patientId, submittedAt FROM responses WHERE formId = ?",
-            (form_id,)
-        ).fetchall()
-        result = []
-        for r in rows:
-            rid = r[0]
-            p = c.execute("SELECT name, email FROM users WHERE id = ?", (r[1],)).fetchone()
-            ans = c.execute(
-                "SELECT questionId, questionText, answerText FROM response_answers WHERE responseId = ?",
-                (rid,)
-            ).fetchall()
-            result.append({
-                "id": str(rid),
-                "patientName": (p[0] if p else "Unknown"),
-                "patientEmail": (p[1] if p else "Unknown"),
-                "answers": [{"questionId": a[0], "questionText": a[1], "answerText": a[2]} for a in ans],
-                "submittedAt": r[2],
-            })
-        return result
+        rows = c.execute(FORM_RESPONSES_SQL, (form_id,)).fetchall()
+        answers = {}
+        for a in c.execute(FORM_RESPONSE_ANSWERS_SQL, (form_id,)):
+            answers.setdefault(a[0], []).append({"questionId": a[1], "questionText": a[2], "answerText": a[3]})
+        return [
+            {
+                "id": r[0],
+                "patientName": r[1] if r[1] is not None else "Unknown",
+                "patientEmail": r[2] if r[2] is not None else "Unknown",
+                "answers": answers.get(r[0], []),
+                "submittedAt": r[3],
+            }
+            for r in rows
+        ]
     except Exception:
         return None
 
@@ -504,25 +935,19 @@ def sqlite_get_my_responses(patient_id: str):
         if not sqlite_conn:
             return None
         c = sqlite_conn.cursor()
-        rows = c.execute(
-            "SELECT id, formId, submittedAt FROM responses WHERE patientId = ?",
-            (patient_id,)
-        ).fetchall()
-        result = []
-        for r in rows:
-            rid = r[0]
-            ft = c.execute("SELECT title FROM forms WHERE id = ?", (r[1],)).fetchone()
-            ans = c.execute(
-                "SELECT questionText, answerText FROM response_answers WHERE responseId = ?",
-                (rid,)
-            ).fetchall()
-            result.append({
-                "id": str(rid),
-                "formTitle": (ft[0] if ft else "Unknown Form"),
-                "answers": [{"questionText": a[0], "answerText": a[1]} for a in ans],
+        rows = c.execute(PATIENT_RESPONSES_SQL, (patient_id,)).fetchall()
+        answers = {}
+        for a in c.execute(PATIENT_RESPONSE_ANSWERS_SQL, (patient_id,)):
+            answers.setdefault(a[0], []).append({"questionText": a[1], "answerText": a[2]})
+        return [
+            {
+                "id": r[0],
+                "formTitle": r[1] if r[1] is not None else "Unknown Form",
+                "answers": answers.get(r[0], []),
                 "submittedAt": r[2],
-            })
-        return result
+            }
+            for r in rows
+        ]
     except Exception:
         return None
 
@@ -570,46 +995,105 @@ class ResponseCreate(BaseModel):
     answers: List[Answer]
 
 # Helper functions
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+def init_bcrypt_executor():
+    global bcrypt_executor, dummy_password_hash
+    # bcrypt releases the GIL, so a thread per core hashes in parallel
+    bcrypt_executor = ThreadPoolExecutor(max_workers=os.cpu_count())
+    # Compared against for unknown usernames so failed logins cost the same
+    dummy_password_hash = bcrypt.hashpw(b"invalid", bcrypt.gensalt(rounds=BCRYPT_COST)).decode('utf-8')
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await asyncio.get_running_loop().run_in_executor(
+        bcrypt_executor, bcrypt.checkpw, plain_password.encode('utf-8'), hashed_password.encode('utf-8')
+    )
 
-def get_password_hash(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+async def get_password_hash(password: str) -> str:
+    hashed = await asyncio.get_running_loop().run_in_executor(
+        bcrypt_executor, bcrypt.hashpw, password.encode('utf-8'), bcrypt.gensalt(rounds=BCRYPT_COST)
+    )
+    return hashed.decode('utf-8')
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    try:
+        return int(hashed_password.split("$")[2]) != BCRYPT_COST
+    except (IndexError, ValueError):
+        return False
 
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(days=7)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
+    to_encode.update({"exp": calendar.timegm(expire.utctimetuple())})
+    signing_input = _JWT_HEADER_B64 + b"." + base64.urlsafe_b64encode(orjson.dumps(to_encode)).rstrip(b"=")
+    h = _HMAC_PROTO.copy()
+    h.update(signing_input)
+    encoded_jwt = signing_input + b"." + base64.urlsafe_b64encode(h.digest()).rstrip(b"=")
+    return encoded_jwt.decode('ascii')
 
-def is_patient_role(role: str) -> bool:
-    return str(role).lower() in {"patient", "patiente"}
+async def get_bearer_token(request: Request) -> str:
+    auth = request.headers.get("authorization")
+    if not auth or auth[:7].lower() != "bearer ":
+        raise HTTPException(status_code=403, detail="Not authenticated")
+    token = auth[7:]
+    if not token.strip():
+        raise HTTPException(status_code=403, detail="Not authenticated")
+    return token
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def get_token_payload(token: str = Depends(get_bearer_token)) -> dict:
+    payload = _auth_cache.get(token)
+    if payload is not None:
+        if time.time() <= payload["exp"]:
+            return payload
+        _auth_cache.pop(token, None)
+    rejected = _rejected_tokens.get(token)
+    if rejected is not None:
+        raise HTTPException(status_code=401, detail=rejected)
     try:
-        token = credentials.credentials
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id = payload.get("sub")
-        if user_id is None:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        user = db.users.get(user_id)
-        if user is None:
-            raise HTTPException(status_code=401, detail="User not found")
-        return user
+        payload = _jwt.decode(token, **_JWT_DECODE_KWARGS)
     except jwt.ExpiredSignatureError:
+        _rejected_tokens[token] = "Token expired"
         raise HTTPException(status_code=401, detail="Token expired")
     except jwt.InvalidTokenError:
+        _rejected_tokens[token] = "Invalid token"
+        raise HTTPException(status_code=401, detail="Invalid token")
+    if payload.get("sub") is None:
+        _rejected_tokens[token] = "Invalid token"
         raise HTTPException(status_code=401, detail="Invalid token")
+    _auth_cache[token] = payload
+    return payload
+
+def get_user_from_payload(payload: dict) -> dict:
+    user = db.users.get(payload["sub"])
+    if user is None:
+        raise HTTPException(status_code=401, detail="User not found")
+    return user
+
+async def get_current_user(payload: dict = Depends(get_token_payload)):
+    return get_user_from_payload(payload)
+
+def require_role(check, detail: str):
+    async def role_dependency(payload: dict = Depends(get_token_payload)):
+        if not check(payload.get("role")):
+            raise HTTPException(status_code=403, detail=detail)
+        return get_user_from_payload(payload)
+    return role_dependency
+
+def require_psychologist(detail: str):
+    return require_role(lambda role: role == "psychologist", detail)
+
+def require_patient(detail: str):
+    return require_role(is_patient_role, detail)
 
 # Auth routes
-@api_router.post("/auth/register", response_model=Token)
+@api_router.post("/auth/register", responses={200: {"model": Token}})
 async def register(user_data: UserRegister):
-    existing_user = next((u for u in db.users.values() if u["username"] == user_data.username), None)
-    if existing_user:
+    global patients_version
+    if user_data.username in db.users_by_username:
         raise HTTPException(status_code=400, detail="Username already exists")
     
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await get_password_hash(user_data.password)
+    # Other registrations may have run during the hash; check again before inserting
+    if user_data.username in db.users_by_username:
+        raise HTTPException(status_code=400, detail="Username already exists")
     user_id = uuid.uuid4().hex
     user = {
         "username": user_data.username,
@@ -622,172 +1106,173 @@ async def register(user_data: UserRegister):
         "_id": user_id
     }
     db.users[user_id] = user
-    save_users()
+    db.users_by_username[user["username"]] = user_id
+    if user["isPatient"]:
+        db.patient_ids.add(user_id)
+        db.patient_role_ids.add(user_id)
+        patients_version += 1
+    mark_dirty("users", user_id)
     try:
         sqlite_insert_user(user)
     except Exception:
         pass
     
-    access_token = create_access_token(data={"sub": str(user["_id"]), "role": user["role"]})
+    access_token = create_access_token(data={"sub": user["_id"], "role": user["role"]})
     
-    return {
+    return UTCORJSONResponse(content={
         "access_token": access_token,
         "token_type": "bearer",
         "user": {
-            "id": str(user["_id"]),
+            "id": user["_id"],
             "username": user["username"],
             "name": user["name"],
             "email": user["email"],
             "role": user["role"]
         }
-    }
+    })
 
-@api_router.post("/auth/login", response_model=Token)
+@api_router.post("/auth/login", responses={200: {"model": Token}})
 async def login(credentials: UserLogin):
-    user = next((u for u in db.users.values() if u["username"] == credentials.username), None)
-    if not user or not verify_password(credentials.password, user["password"]):
+    user_id = db.users_by_username.get(credentials.username)
+    user = db.users.get(user_id) if user_id else None
+    if not user:
+        if dummy_password_hash:
+            await verify_password(credentials.password, dummy_password_hash)
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    if not await verify_password(credentials.password, user["password"]):
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    if password_needs_rehash(user["password"]):
+        user["password"] = await get_password_hash(credentials.password)
+        mark_dirty("users", user["_id"])
+        try:
+            sqlite_insert_user(user)
+        except Exception:
+            pass
     
-    access_token = create_access_token(data={"sub": str(user["_id"]), "role": user["role"]})
+    access_token = create_access_token(data={"sub": user["_id"], "role": user["role"]})
     
-    return {
+    return UTCORJSONResponse(content={
         "access_token": access_token,
         "token_type": "bearer",
         "user": {
-            "id": str(user["_id"]),
+            "id": user["_id"],
             "username": user["username"],
             "name": user["name"],
             "email": user["email"],
             "role": user["role"]
         }
-    }
+    })
 
 @api_router.get("/auth/me")
 async def get_me(current_user: dict = Depends(get_current_user)):
-    return {
-        "id": str(current_user["_id"]),
+    return cached_json_response(("me", current_user["_id"]), lambda: {
+        "id": current_user["_id"],
         "username": current_user["username"],
         "name": current_user["name"],
         "email": current_user["email"],
         "role": current_user["role"]
-    }
+    })
 
 # Psychologist routes - Forms
 @api_router.post("/forms")
-async def create_form(form_data: FormCreate, current_user: dict = Depends(get_current_user)):
-    if current_user["role"] != "psychologist":
-        raise HTTPException(status_code=403, detail="Only psychologists can create forms")
-    recent_duplicate = next(
-        (
-            f for f in db.forms.values()
-            if f.get("createdBy") == str(current_user["_id"]) and f.get("title") == form_data.title and (datetime.utcnow() - f["createdAt"]).total_seconds() < 5
-        ),
-        None,
-    )
-    if recent_duplicate:
+async def create_form(form_data: FormCreate, current_user: dict = Depends(require_psychologist("Only psychologists can create forms"))):
+    uid = current_user["_id"]
+    now = datetime.utcnow()
+    latest = db.forms.get(db.latest_form_by_title.get((uid, form_data.title)))
+    if latest and latest.get("title") == form_data.title and (now - latest["createdAt"]).total_seconds() < 5:
         raise HTTPException(status_code=409, detail="Duplicate form submission detected")
     
     form_id = uuid.uuid4().hex
     form = {
         "title": form_data.title,
         "description": form_data.description,
-        "questions": [q.dict() for q in form_data.questions],
-        "createdBy": str(current_user["_id"]),
-        "createdAt": datetime.utcnow(),
-        "updatedAt": datetime.utcnow(),
-        "assignedPatients": [
-            pid for pid in (form_data.assignedPatientIds or [])
-            if (
-                is_patient_role(db.users.get(pid, {}).get("role"))
-                or bool(db.users.get(pid, {}).get("isPatient"))
-            )
-        ],
+        "questions": [q.model_dump() for q in form_data.questions],
+        "createdBy": uid,
+        "createdAt": now,
+        "updatedAt": now,
+        "assignedPatients": {pid for pid in (form_data.assignedPatientIds or []) if pid in db.patient_ids},
         "_id": form_id
     }
     db.forms[form_id] = form
-    save_forms()
+    index_form(form_id, form)
+    mark_dirty("forms", form_id)
     try:
         sqlite_insert_form(form)
     except Exception:
         pass
     
-    return {
-        "id": str(form["_id"]),
+    return UTCORJSONResponse(content={
+        "id": form["_id"],
         "title": form["title"],
         "description": form["description"],
         "questions": form["questions"],
-        "createdAt": form["createdAt"].isoformat(),
-        "updatedAt": form["updatedAt"].isoformat()
-    }
+        "createdAt": form["createdAt"],
+        "updatedAt": form["updatedAt"]
+    })
 
 @api_router.get("/forms")
-async def get_forms(current_user: dict = Depends(get_current_user)):
-    if current_user["role"] != "psychologist":
-        raise HTTPException(status_code=403, detail="Only psychologists can view their forms")
-    
-    res = sqlite_get_forms_for_psychologist(str(current_user["_id"]))
-    if res is not None:
-        return res
-    forms = [f for f in db.forms.values() if f.get("createdBy") == str(current_user["_id"]) ]
-    result = []
-    for form in forms:
-        response_count = sum(1 for r in db.responses.values() if r.get("formId") == str(form["_id"]))
-        result.append({
-            "id": str(form["_id"]),
+async def get_forms(current_user: dict = Depends(require_psychologist("Only psychologists can view their forms"))):
+    uid = current_user["_id"]
+    body = sqlite_get_forms_for_psychologist(uid)
+    if body is not None:
+        return Response(content=body, media_type="application/json")
+    return UTCORJSONResponse(content=[
+        {
+            "id": form["_id"],
             "title": form["title"],
             "description": form.get("description", ""),
             "questionCount": len(form.get("questions", [])),
-            "responseCount": response_count,
-            "createdAt": form["createdAt"].isoformat(),
-            "updatedAt": form["updatedAt"].isoformat()
-        })
-    return result
+            "responseCount": len(db.responses_by_form.get(form["_id"], ())),
+            "createdAt": form["createdAt"],
+            "updatedAt": form["updatedAt"]
+        }
+        for form in (db.forms[fid] for fid in db.forms_by_creator.get(uid, ()))
+    ])
 
 @api_router.get("/forms/{form_id}")
 async def get_form(form_id: str, current_user: dict = Depends(get_current_user)):
-    f_sql = sqlite_get_form_by_id(form_id)
+    uid = current_user["_id"]
+    f_sql = load_form(form_id)
     if f_sql is not None:
-        if current_user["role"] == "psychologist" and str(f_sql["createdBy"]) != str(current_user["_id"]):
+        if current_user["role"] == "psychologist" and f_sql["createdBy"] != uid:
             raise HTTPException(status_code=403, detail="Not authorized")
-        if is_patient_role(current_user["role"]) and str(current_user["_id"]) not in f_sql.get("assignedPatients", []):
+        if uid in db.patient_role_ids and uid not in f_sql["assignedPatients"]:
             raise HTTPException(status_code=403, detail="Form not assigned to you")
-        return {
-            "id": str(f_sql["_id"]),
+        return UTCORJSONResponse(content={
+            "id": f_sql["_id"],
             "title": f_sql["title"],
             "description": f_sql.get("description", ""),
             "questions": f_sql.get("questions", []),
-            "assignedPatients": f_sql.get("assignedPatients", []),
-            "createdAt": str(f_sql["createdAt"]),
-            "updatedAt": str(f_sql["updatedAt"]),
-        }
+            "assignedPatients": sorted(f_sql["assignedPatients"]),
+            "createdAt": f_sql["createdAt"],
+            "updatedAt": f_sql["updatedAt"],
+        })
     form = db.forms.get(form_id)
     if not form:
         raise HTTPException(status_code=404, detail="Form not found")
-    if current_user["role"] == "psychologist" and form["createdBy"] != str(current_user["_id"]):
+    if current_user["role"] == "psychologist" and form["createdBy"] != uid:
         raise HTTPException(status_code=403, detail="Not authorized")
-    if is_patient_role(current_user["role"]) and str(current_user["_id"]) not in form.get("assignedPatients", []):
+    if uid in db.patient_role_ids and uid not in form["assignedPatients"]:
         raise HTTPException(status_code=403, detail="Form not assigned to you")
-    return {
-        "id": str(form["_id"]),
+    return UTCORJSONResponse(content={
+        "id": form["_id"],
         "title": form["title"],
         "description": form.get("description", ""),
         "questions": form.get("questions", []),
-        "assignedPatients": form.get("assignedPatients", []),
-        "createdAt": form["createdAt"].isoformat(),
-        "updatedAt": form["updatedAt"].isoformat()
-    }
+        "assignedPatients": sorted(form["assignedPatients"]),
+        "createdAt": form["createdAt"],
+        "updatedAt": form["updatedAt"]
+    })
 
 @api_router.put("/forms/{form_id}")
-async def update_form(form_id: str, form_data: FormUpdate, current_user: dict = Depends(get_current_user)):
-    if current_user["role"] != "psychologist":
-        raise HTTPException(status_code=403, detail="Only psychologists can update forms")
-    
+async def update_form(form_id: str, form_data: FormUpdate, current_user: dict = Depends(require_psychologist("Only psychologists can update forms"))):
+    uid = current_user["_id"]
     form = db.forms.get(form_id)
     
     if not form:
         raise HTTPException(status_code=404, detail="Form not found")
     
-    if form["createdBy"] != str(current_user["_id"]):
+    if form["createdBy"] != uid:
         raise HTTPException(status_code=403, detail="Not authorized")
     
     update_data = {"updatedAt": datetime.utcnow()}
@@ -796,170 +1281,167 @@ async def update_form(form_id: str, form_data: FormUpdate, current_user: dict =
     if form_data.description is not None:
         update_data["description"] = form_data.description
     if form_data.questions is not None:
-        update_data["questions"] = [q.dict() for q in form_data.questions]
+        update_data["questions"] = [q.model_dump() for q in form_data.questions]
     if form_data.assignedPatientIds is not None:
-        update_data["assignedPatients"] = [
-            pid for pid in (form_data.assignedPatientIds or [])
-            if (
-                is_patient_role(db.users.get(pid, {}).get("role"))
-                or bool(db.users.get(pid, {}).get("isPatient"))
-            )
-        ]
+        update_data["assignedPatients"] = {pid for pid in (form_data.assignedPatientIds or []) if pid in db.patient_ids}
     
-    db.forms[form_id].update(update_data)
-    updated_form = db.forms.get(form_id)
-    save_forms()
+    if "assignedPatients" in update_data:
+        old_ids = form.get("assignedPatients", set())
+        new_ids = update_data["assignedPatients"]
+        for pid in old_ids - new_ids:
+            db.forms_by_patient.get(pid, set()).discard(form_id)
+        for pid in new_ids - old_ids:
+            db.forms_by_patient.setdefault(pid, set()).add(form_id)
+    retitled = "title" in update_data and update_data["title"] != form.get("title")
+    if retitled:
+        unindex_form_title(form_id, form)
+    form.update(update_data)
+    if retitled:
+        index_form_title(form_id, form)
+    mark_dirty("forms", form_id)
     try:
-        sqlite_update_form(form_id, {
-            "title": update_data.get("title"),
-            "description": update_data.get("description"),
-            "updatedAt": update_data.get("updatedAt"),
-            "questions": updated_form.get("questions"),
-            "assignedPatients": updated_form.get("assignedPatients")
-        })
+        sqlite_update_form(form_id, form)
     except Exception:
         pass
-    return {
-        "id": str(updated_form["_id"]),
-        "title": updated_form["title"],
-        "description": updated_form.get("description", ""),
-        "questions": updated_form.get("questions", []),
-        "updatedAt": updated_form["updatedAt"].isoformat()
-    }
+    _form_cache.pop(form_id, None)
+    return UTCORJSONResponse(content={
+        "id": form["_id"],
+        "title": form["title"],
+        "description": form.get("description", ""),
+        "questions": form.get("questions", []),
+        "updatedAt": form["updatedAt"]
+    })
 
 @api_router.delete("/forms/{form_id}")
-async def delete_form(form_id: str, current_user: dict = Depends(get_current_user)):
-    if current_user["role"] != "psychologist":
-        raise HTTPException(status_code=403, detail="Only psychologists can delete forms")
-    
+async def delete_form(form_id: str, current_user: dict = Depends(require_psychologist("Only psychologists can delete forms"))):
+    uid = current_user["_id"]
     form = db.forms.get(form_id)
     
     if not form:
         raise HTTPException(status_code=404, detail="Form not found")
     
-    if form["createdBy"] != str(current_user["_id"]):
+    if form["createdBy"] != uid:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    db.forms.pop(form_id, None)
-    db.responses = {rid: r for rid, r in db.responses.items() if r.get("formId") != form_id}
-    save_forms()
-    save_responses()
+    drop_form(form_id, form)
     try:
         sqlite_delete_form(form_id)
     except Exception:
         pass
+    _form_cache.pop(form_id, None)
     
-    return {"message": "Form deleted successfully"}
+    return UTCORJSONResponse(content={"message": "Form deleted successfully"})
 
 @api_router.get("/forms/{form_id}/responses")
-async def get_form_responses(form_id: str, current_user: dict = Depends(get_current_user)):
-    if current_user["role"] != "psychologist":
-        raise HTTPException(status_code=403, detail="Only psychologists can view responses")
-    f_sql = sqlite_get_form_by_id(form_id)
+async def get_form_responses(form_id: str, current_user: dict = Depends(require_psychologist("Only psychologists can view responses"))):
+    uid = current_user["_id"]
+    f_sql = load_form(form_id)
     if f_sql is not None:
-        if str(f_sql.get("createdBy")) != str(current_user["_id"]):
+        if f_sql.get("createdBy") != uid:
             raise HTTPException(status_code=403, detail="Not authorized")
         res = sqlite_get_form_responses(form_id)
         if res is not None:
-            return res
+            return UTCORJSONResponse(content=res)
     form = db.forms.get(form_id)
     if not form:
         raise HTTPException(status_code=404, detail="Form not found")
-    if form["createdBy"] != str(current_user["_id"]):
+    if form["createdBy"] != uid:
         raise HTTPException(status_code=403, detail="Not authorized")
-    responses = [r for r in db.responses.values() if r.get("formId") == form_id]
-    result = []
-    for response in responses:
-        patient = db.users.get(response["patientId"])
-        result.append({
-            "id": str(response.get("_id")),
-            "patientName": patient["name"] if patient else "Unknown",
-            "patientEmail": patient["email"] if patient else "Unknown",
+    responses = [db.responses[rid] for rid in db.responses_by_form.get(form_id, ())]
+    # Responses saved before patient details were denormalized resolve them once per patient
+    unknown = {"name": "Unknown", "email": "Unknown"}
+    patients = {
+        pid: db.users.get(pid) or unknown
+        for pid in {r["patientId"] for r in responses if "patientName" not in r}
+    }
+    return UTCORJSONResponse(content=[
+        {
+            "id": response["_id"],
+            "patientName": response["patientName"] if "patientName" in response else patients[response["patientId"]]["name"],
+            "patientEmail": response.get("patientEmail") if "patientName" in response else patients[response["patientId"]]["email"],
             "answers": response["answers"],
-            "submittedAt": response["submittedAt"].isoformat()
-        })
-    return result
+            "submittedAt": response["submittedAt"]
+        }
+        for response in responses
+    ])
 
 # Patient routes
 @api_router.get("/patient/forms")
-async def get_available_forms(current_user: dict = Depends(get_current_user)):
-    if not is_patient_role(current_user["role"]):
-        raise HTTPException(status_code=403, detail="Only patients can view available forms")
-    res = sqlite_get_patient_available_forms(str(current_user["_id"]))
+async def get_available_forms(current_user: dict = Depends(require_patient("Only patients can view available forms"))):
+    uid = current_user["_id"]
+    res = sqlite_get_patient_available_forms(uid)
     if res is not None:
-        return res
-    responded_form_ids = {r.get("formId") for r in db.responses.values() if r.get("patientId") == str(current_user["_id"]) }
-    forms = [f for f in db.forms.values() if str(f.get("_id")) not in responded_form_ids and str(current_user["_id"]) in f.get("assignedPatients", [])]
-    result = []
-    for form in forms:
-        psychologist = db.users.get(form["createdBy"])
-        result.append({
-            "id": str(form["_id"]),
+        return UTCORJSONResponse(content=res)
+    forms = [db.forms[fid] for fid in db.forms_by_patient.get(uid, set()) - db.responded_forms_by_patient.get(uid, set())]
+    psychologist_names = {
+        pid: (db.users[pid]["name"] if pid in db.users else "Unknown")
+        for pid in {f["createdBy"] for f in forms}
+    }
+    return UTCORJSONResponse(content=[
+        {
+            "id": form["_id"],
             "title": form["title"],
             "description": form.get("description", ""),
             "questionCount": len(form.get("questions", [])),
-            "psychologistName": psychologist["name"] if psychologist else "Unknown",
-            "createdAt": form["createdAt"].isoformat()
-        })
-    return result
+            "psychologistName": psychologist_names[form["createdBy"]],
+            "createdAt": form["createdAt"]
+        }
+        for form in forms
+    ])
 
 @api_router.post("/responses")
-async def submit_response(response_data: ResponseCreate, current_user: dict = Depends(get_current_user)):
-    if not is_patient_role(current_user["role"]):
-        raise HTTPException(status_code=403, detail="Only patients can submit responses")
+async def submit_response(response_data: ResponseCreate, current_user: dict = Depends(require_patient("Only patients can submit responses"))):
+    uid = current_user["_id"]
     form = db.forms.get(response_data.formId)
     
     if not form:
         raise HTTPException(status_code=404, detail="Form not found")
     
-    if str(current_user["_id"]) not in form.get("assignedPatients", []):
+    if uid not in form["assignedPatients"]:
         raise HTTPException(status_code=403, detail="Form not assigned to you")
     
-    already = next((
-        r for r in db.responses.values()
-        if r.get("formId") == response_data.formId and r.get("patientId") == str(current_user["_id"])
-    ), None)
-    if already:
+    if response_data.formId in db.responded_forms_by_patient.get(uid, ()):
         raise HTTPException(status_code=409, detail="You have already responded to this form")
     
     response = {
         "formId": response_data.formId,
         "formTitle": form["title"],
-        "patientId": str(current_user["_id"]),
-        "answers": [a.dict() for a in response_data.answers],
+        "patientId": uid,
+        "patientName": current_user.get("name"),
+        "patientEmail": current_user.get("email"),
+        "answers": [a.model_dump() for a in response_data.answers],
         "submittedAt": datetime.utcnow(),
     }
     response_id = uuid.uuid4().hex
     response["_id"] = response_id
     db.responses[response_id] = response
-    save_responses()
+    index_response(response_id, response)
+    mark_dirty("responses", response_id)
     try:
         sqlite_insert_response(response)
     except Exception:
         pass
     
-    return {
-        "id": str(response_id),
+    return UTCORJSONResponse(content={
+        "id": response_id,
         "message": "Response submitted successfully"
-    }
+    })
 
 @api_router.get("/responses/my")
-async def get_my_responses(current_user: dict = Depends(get_current_user)):
-    if not is_patient_role(current_user["role"]):
-        raise HTTPException(status_code=403, detail="Only patients can view their responses")
-    res = sqlite_get_my_responses(str(current_user["_id"]))
+async def get_my_responses(current_user: dict = Depends(require_patient("Only patients can view their responses"))):
+    uid = current_user["_id"]
+    res = sqlite_get_my_responses(uid)
     if res is not None:
-        return res
-    responses = [r for r in db.responses.values() if r.get("patientId") == str(current_user["_id"]) ]
-    result = []
-    for response in responses:
-        result.append({
-            "id": str(response.get("_id")),
+        return UTCORJSONResponse(content=res)
+    return UTCORJSONResponse(content=[
+        {
+            "id": response["_id"],
             "formTitle": response.get("formTitle", "Unknown Form"),
             "answers": response["answers"],
-            "submittedAt": response["submittedAt"].isoformat()
-        })
-    return result
+            "submittedAt": response["submittedAt"]
+        }
+        for response in (db.responses[rid] for rid in db.responses_by_patient.get(uid, ()))
+    ])
 
 # NOTE: router inclusion and middleware registration moved to end of file
 
@@ -971,34 +1453,37 @@ logger = logging.getLogger(__name__)
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    return
+    if flush_task is not None:
+        flush_task.cancel()
+    if snapshot_executor is not None:
+        snapshot_executor.shutdown(wait=True)
+    flush_dirty()
+    if bcrypt_executor is not None:
+        bcrypt_executor.shutdown(wait=False)
 @app.on_event("startup")
 async def startup_event():
+    global flush_task, snapshot_executor
+    load_users()
+    load_forms()
+    load_responses()
+    init_bcrypt_executor()
+    snapshot_executor = ThreadPoolExecutor(max_workers=1)
+    flush_task = asyncio.create_task(flush_loop())
     init_mongo_architecture()
     init_sqlite()
+    recover_from_sqlite()
     migrate_json_to_sqlite()
 @api_router.get("/patients")
-async def list_patients(current_user: dict = Depends(get_current_user)):
-    if current_user["role"] != "psychologist":
-        raise HTTPException(status_code=403, detail="Only psychologists can list patients")
-    patients = [
+async def list_patients(current_user: dict = Depends(require_psychologist("Only psychologists can list patients"))):
+    return cached_json_response(("patients", patients_version), lambda: [
         {
-            "id": str(u.get("_id")),
+            "id": u["_id"],
             "name": u.get("name"),
             "email": u.get("email"),
             "username": u.get("username"),
         }
-        for u in db.users.values() if is_patient_role(u.get("role")) or bool(u.get("isPatient"))
-    ]
-    return patients
+        for u in db.users.values() if u["isPatient"]
+    ])
 
-# Include the router and middleware at the end, after all routes have been defined
+# Include the router at the end, after all routes have been defined
 app.include_router(api_router)
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_credentials=True,
-    allow_origins=["*"],
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
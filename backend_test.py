@@ -7,6 +7,8 @@ Testa todos os endpoints de autenticação, psicólogo e paciente
 import requests
 import json
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 # URL base do backend
@@ -15,6 +17,10 @@ BASE_URL = "https://psych-forms.preview.emergentagent.com/api"
 class BackendTester:
     def __init__(self):
         self.base_url = BASE_URL
+        # Sessão reutilizada: mantém a conexão (keep-alive) em vez de um novo handshake TLS por requisição
+        self.session = requests.Session()
+        # Estado por thread dos testes executados em paralelo (sessão, saída e resultados próprios)
+        self._local = threading.local()
         self.psychologist_token = None
         self.patient_token = None
         self.created_form_id = None
@@ -37,14 +43,22 @@ class BackendTester:
             "role": "patient"
         }
         
+    def emit(self, line):
+        """Imprime a linha, ou a guarda se o teste estiver rodando em paralelo"""
+        output = getattr(self._local, "output", None)
+        if output is None:
+            print(line)
+        else:
+            output.append(line)
+    
     def log_test(self, test_name, success, details=""):
         """Log do resultado do teste"""
         status = "✅ PASSOU" if success else "❌ FALHOU"
-        print(f"{status} - {test_name}")
+        self.emit(f"{status} - {test_name}")
         if details:
-            print(f"   Detalhes: {details}")
+            self.emit(f"   Detalhes: {details}")
         
-        self.test_results.append({
+        getattr(self._local, "results", self.test_results).append({
             "test": test_name,
             "success": success,
             "details": details,
@@ -54,24 +68,49 @@ class BackendTester:
     def make_request(self, method, endpoint, data=None, headers=None):
         """Faz requisição HTTP"""
         url = f"{self.base_url}{endpoint}"
+        session = getattr(self._local, "session", self.session)
         try:
             if method == "GET":
-                response = requests.get(url, headers=headers, timeout=30)
+                response = session.get(url, headers=headers, timeout=30)
             elif method == "POST":
-                response = requests.post(url, json=data, headers=headers, timeout=30)
+                response = session.post(url, json=data, headers=headers, timeout=30)
             elif method == "PUT":
-                response = requests.put(url, json=data, headers=headers, timeout=30)
+                response = session.put(url, json=data, headers=headers, timeout=30)
             elif method == "DELETE":
-                response = requests.delete(url, headers=headers, timeout=30)
+                response = session.delete(url, headers=headers, timeout=30)
             
             return response
         except requests.exceptions.RequestException as e:
-            print(f"Erro na requisição {method} {url}: {str(e)}")
+            self.emit(f"Erro na requisição {method} {url}: {str(e)}")
             return None
         except Exception as e:
-            print(f"Erro inesperado na requisição {method} {url}: {str(e)}")
+            self.emit(f"Erro inesperado na requisição {method} {url}: {str(e)}")
             return None
     
+    def run_isolated(self, test):
+        """Executa um teste com sessão própria, guardando sua saída e seus resultados"""
+        self._local.session = requests.Session()
+        self._local.output = []
+        self._local.results = []
+        try:
+            test()
+        finally:
+            self._local.session.close()
+        outcome = (self._local.output, self._local.results)
+        # As threads do pool são reutilizadas; limpa o estado para o próximo teste
+        del self._local.session, self._local.output, self._local.results
+        return outcome
+    
+    def run_concurrently(self, *tests):
+        """Executa em paralelo testes que não dependem do estado uns dos outros.
+        A saída e os resultados são registrados na ordem em que os testes foram passados"""
+        with ThreadPoolExecutor(max_workers=len(tests)) as executor:
+            outcomes = list(executor.map(self.run_isolated, tests))
+        for output, results in outcomes:
+            for line in output:
+                print(line)
+            self.test_results.extend(results)
+    
     def get_auth_headers(self, token):
         """Retorna headers de autenticação"""
         return {"Authorization": f"Bearer {token}"}
@@ -491,23 +530,23 @@ class BackendTester:
         
         # Testes de autenticação
         print("\n📋 TESTES DE AUTENTICAÇÃO")
-        self.test_psychologist_registration()
-        self.test_patient_registration()
+        self.run_concurrently(
+            self.test_psychologist_registration,
+            self.test_patient_registration,
+            self.test_invalid_login,
+        )
         self.test_psychologist_login()
-        self.test_invalid_login()
         self.test_token_verification()
         
         # Testes do fluxo do psicólogo
         print("\n👩‍⚕️ TESTES DO FLUXO DO PSICÓLOGO")
         self.test_create_form()
-        self.test_list_psychologist_forms()
-        self.test_get_form_details()
+        self.run_concurrently(self.test_list_psychologist_forms, self.test_get_form_details)
         self.test_update_form()
         
         # Testes do fluxo do paciente
         print("\n🧑‍🦱 TESTES DO FLUXO DO PACIENTE")
-        self.test_patient_list_forms()
-        self.test_patient_view_form()
+        self.run_concurrently(self.test_patient_list_forms, self.test_patient_view_form)
         self.test_patient_submit_response()
         self.test_patient_view_responses()
         
@@ -517,9 +556,11 @@ class BackendTester:
         
         # Testes de validação e segurança
         print("\n🔒 TESTES DE VALIDAÇÃO E SEGURANÇA")
-        self.test_patient_cannot_create_form()
-        self.test_psychologist_cannot_access_patient_endpoints()
-        self.test_unauthorized_access()
+        self.run_concurrently(
+            self.test_patient_cannot_create_form,
+            self.test_psychologist_cannot_access_patient_endpoints,
+            self.test_unauthorized_access,
+        )
         
         # Teste de limpeza
         print("\n🗑️ TESTE DE LIMPEZA")
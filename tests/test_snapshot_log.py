@@ -0,0 +1,98 @@
+import asyncio
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import orjson
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import server  # noqa: E402
+
+
+@pytest.fixture
+def forms_path(tmp_path, monkeypatch):
+    path = tmp_path / "forms.json"
+    monkeypatch.setattr(server, "DATA_DIR", tmp_path)
+    monkeypatch.setitem(server.SNAPSHOT_PATHS, "forms", path)
+    monkeypatch.setitem(server.log_entries, "forms", 0)
+    return path
+
+
+def log_line(record_id, doc):
+    return orjson.dumps({"id": record_id, "doc": doc}) + b"\n"
+
+
+def test_torn_last_line_is_cut_before_the_next_append(forms_path):
+    forms_path.write_bytes(b"{}")
+    server.log_path(forms_path).write_bytes(log_line("a", 1) + b'{"id": "b", "do')
+
+    assert server.read_store("forms") == {"a": 1}
+    assert server.log_path(forms_path).read_bytes() == log_line("a", 1)
+
+    server.append_log_bytes(forms_path, log_line("c", 3))
+    assert server.read_store("forms") == {"a": 1, "c": 3}
+
+
+def test_delete_entries_remove_records(forms_path):
+    forms_path.write_bytes(orjson.dumps({"a": 1, "b": 2}))
+    server.log_path(forms_path).write_bytes(log_line("a", None))
+
+    assert server.read_store("forms") == {"b": 2}
+    assert server.log_entries["forms"] == 1
+
+
+def test_compaction_leaves_only_the_snapshot(forms_path):
+    server.append_log_bytes(forms_path, log_line("a", 1))
+
+    server.write_compacted(forms_path, orjson.dumps({"a": 1}))
+
+    assert not server.log_path(forms_path).exists()
+    assert not server.rotated_log_path(forms_path).exists()
+    assert not server.snapshot_tmp_path(forms_path).exists()
+    assert server.read_store("forms") == {"a": 1}
+
+
+def test_crash_before_swap_replays_the_rotated_log(forms_path):
+    # Log rotated and new snapshot written to .tmp, but never swapped in
+    forms_path.write_bytes(orjson.dumps({"a": 0}))
+    server.rotated_log_path(forms_path).write_bytes(log_line("a", 1) + log_line("b", 2))
+    server.snapshot_tmp_path(forms_path).write_bytes(b"{}")
+
+    assert server.read_store("forms") == {"a": 1, "b": 2}
+    assert not server.rotated_log_path(forms_path).exists()
+    assert not server.snapshot_tmp_path(forms_path).exists()
+    assert server.read_store("forms") == {"a": 1, "b": 2}
+
+
+def test_crash_after_swap_ignores_the_rotated_log(forms_path):
+    # New snapshot swapped in; the rotated log is older than it and must not be replayed
+    forms_path.write_bytes(orjson.dumps({"a": 5}))
+    server.rotated_log_path(forms_path).write_bytes(log_line("a", 1) + log_line("a", None))
+
+    assert server.read_store("forms") == {"a": 5}
+    assert not server.rotated_log_path(forms_path).exists()
+
+
+def test_failed_append_requeues_the_records(forms_path, monkeypatch):
+    def fail(path, body):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(server, "append_log_bytes", fail)
+    monkeypatch.setattr(server, "SAVE_INTERVAL_SECONDS", 0.01)
+    monkeypatch.setattr(server, "sqlite_conn", None)
+    monkeypatch.setattr(server.db, "forms", {"a": {"title": "T"}})
+    monkeypatch.setitem(server._pending, "forms", {"a"})
+    monkeypatch.setattr(server, "snapshot_executor", ThreadPoolExecutor(max_workers=1))
+
+    async def run_briefly():
+        task = asyncio.create_task(server.flush_loop())
+        await asyncio.sleep(0.05)
+        task.cancel()
+
+    asyncio.run(run_briefly())
+    server.snapshot_executor.shutdown(wait=True)
+
+    assert server._pending["forms"] == {"a"}
+    assert server.log_entries["forms"] == 0